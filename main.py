@@ -1,21 +1,66 @@
 from __future__ import annotations
 
-import logging
+# O Tesseract (e o OpenCV/numpy) usam várias threads por página via OpenMP.
+# Em imagens pequenas como faturas isso só atrasa, e com vários PDFs em paralelo
+# os processos ainda brigam pelos mesmos núcleos. Por isso limitamos a 1 thread,
+# ANTES de importar qualquer biblioteca. Quem quiser voltar ao normal (ex: páginas
+# enormes, um ficheiro de cada vez) pode definir OMP_THREAD_LIMIT / OMP_NUM_THREADS
+# no sistema, que estes valores não se sobrepõem.
 import os
-import re
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+import hashlib
+import importlib.util
+import json
+import logging
+import math
+import queue
+import sys
+import tempfile
+import threading
+import time
 import tkinter as tk
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 from tkinter import filedialog, messagebox
 
 # Bibliotecas externas
 import pdfplumber
 import pytesseract
+from PIL import Image
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Border, Side
 
+# Opcional: tesserocr fala com o Tesseract por dentro do Python (sem abrir o .exe)
+try:
+    from tesserocr import PyTessBaseAPI, PSM, OEM
+except ImportError:
+    PyTessBaseAPI = None
+
+# Opcional: pdfplumber-rs (mesma API do pdfplumber, escrito em Rust) para o texto digital
+try:
+    import pdfplumber_rs
+except ImportError:
+    pdfplumber_rs = None
+
+# Opcional: PyMuPDF (fitz) desenha as páginas em C, bem mais rápido que o pdfplumber
+try:
+    import fitz
+except ImportError:
+    fitz = None
+
+# Opcional: OpenCV para limpar a imagem (preto e branco) antes do OCR
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+
 # ==========================================
 # 1. CONFIGURAÇÃO DO "MOTOR" DE LEITURA (TESSERACT)
 # ==========================================
@@ -41,6 +86,31 @@ else:
     # Se não encontrar, avisa no terminal, mas o código continua (só não vai ler imagens).
     print(f"❌ ERRO CRÍTICO: O arquivo não está em: {CAMINHO_EXECUTAVEL}")
 
+# Pasta com os modelos de idioma (usada pelo tesserocr)
+PASTA_TESSDATA = os.path.join(PASTA_INSTALACAO, 'tessdata')
+
+# Quantas páginas do início são lidas para decidir se o PDF é digital ou imagem.
+# São 2 (e não 1) por causa dos PDFs que começam com uma capa quase sem texto.
+PAGINAS_AMOSTRA = 2
+
+# Opções do OCR. 200 DPI chegam para faturas e têm ~2,25x menos píxeis que 300.
+# --psm 6: trata a página como um bloco de texto (sem análise de layout completa)
+# --oem 1: só o motor LSTM (mais rápido que o modo combinado com o motor antigo)
+RESOLUCAO_OCR = 200
+RESOLUCAO_OCR_REFORCO = 300  # Segunda tentativa, se a 200 DPI não se achou valor
+CONFIG_OCR = "--psm 6 --oem 1 -c tessedit_do_invert=0"
+
+# Nomes usados no campo 'Método' para o texto lido por imagem
+METODO_OCR = "OCR (IA Visual)"
+OCR_PENDENTE = "OCR_PENDENTE"  # Página já gravada em PNG, à espera do OCR em lote
+
+# Máximo de PDFs que cada processo lê de uma vez (e, portanto, de imagens que vão
+# juntas para uma só execução do Tesseract). Ver _tamanho_lote.
+TAMANHO_LOTE = 10
+
+# Quantos bytes do início e do fim de um PDF grande entram no hash do cache
+BLOCO_HASH = 64 * 1024
+
 # Configurações gerais de visualização de logs e nome da janela
 APP_TITLE = "ConciliaPDF — Versão Final (Com Totais)"
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(message)s")
@@ -48,7 +118,7 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(message)s")
 # ==========================================
 # 2. ESTRUTURA DE DADOS (A "FICHA" DO FICHEIRO)
 # ==========================================
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PdfItem:
     """
     Isto define o 'molde' de cada linha do Excel.
@@ -64,202 +134,563 @@ class PdfItem:
 # ==========================================
 # 3. FUNÇÕES MATEMÁTICAS E DE LIMPEZA
 # ==========================================
+# Ficam no moeda.py (ver lá), para poderem ser compiladas com o Cython.
+import moeda
 
-def br_money_to_float(raw: str) -> float:
+def _moeda_desatualizado() -> bool:
     """
-    Traduz o formato brasileiro (1.000,00) para formato de computador (1000.00).
-    Sem isto, não conseguimos somar os valores.
+    O Python prefere sempre o moeda.*.pyd/.so compilado ao moeda.py. Se o moeda.py foi
+    alterado depois da compilação, o compilado ainda tem as regras antigas (e gravaria
+    os resultados delas no cache, com a versão nova).
     """
-    if not clean : return 0.0
-    
-    # Remove tudo o que não for número, vírgula ou ponto (tira letras, R$, espaços)
-    clean = re.sub(r"[^\d,\.]", "", str(raw)) #remove tudo o que não for número, vírgula ou ponto (tira letras, R$, espaços)
-    if not clean: return 0.0
-    
-    # Troca a pontuação:
-    # 1. Remove o ponto de milhar (1.000 vira 1000)
-    # 2. Troca a vírgula decimal por ponto (50,90 vira 50.90)
-    clean = clean.replace(".", "").replace(",", ".")
-    
-    try:
-        return float(clean) # Converte texto para número real
-    except ValueError:
-        return 0.0
+    compilado = Path(moeda.__file__)
+    fonte = compilado.with_name("moeda.py")
+    if compilado.suffix == ".py" or not fonte.exists():
+        return False
+    return fonte.stat().st_mtime > compilado.stat().st_mtime
+
+if _moeda_desatualizado():
+    logging.warning("O %s é mais antigo que o moeda.py; a usar o moeda.py. "
+                    "Compile de novo: python setup.py build_ext --inplace", Path(moeda.__file__).name)
+    _spec = importlib.util.spec_from_file_location("moeda", Path(moeda.__file__).with_name("moeda.py"))
+    moeda = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(moeda)
+    sys.modules["moeda"] = moeda
+
+VERSAO_REGRAS, extrair_valor, format_br = moeda.VERSAO_REGRAS, moeda.extrair_valor, moeda.format_br
+
+# ==========================================
+# MOTOR DE OCR
+# ==========================================
+# Um motor por thread (logo, pelo menos um por processo), criado só quando for preciso.
+# O mesmo motor tesserocr NÃO pode ser usado por duas threads ao mesmo tempo.
+_TESS_LOCAL = threading.local()
 
-def format_br(value: float) -> str:
+def _tess_api():
     """
-    Faz o oposto da função anterior.
-    Pega no número de cálculo e deixa bonito para o Excel (R$ 1.200,50).
+    Devolve o motor tesserocr desta thread, carregando o português UMA só vez.
+    Se o tesserocr não estiver instalado (ou falhar ao abrir), devolve None
+    e o programa continua a usar o pytesseract.
     """
-    # Usa um truque com 'X' para trocar ponto por vírgula sem baralhar os dois
-    return f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    global PyTessBaseAPI
+    api = getattr(_TESS_LOCAL, "api", None)
+    if api is None and PyTessBaseAPI is not None:
+        try:
+            api = PyTessBaseAPI(path=PASTA_TESSDATA, lang="por", psm=PSM.SINGLE_BLOCK, oem=OEM.LSTM_ONLY)
+            api.SetVariable("tessedit_do_invert", "0")
+            _TESS_LOCAL.api = api
+        except Exception as e:
+            logging.warning("tesserocr indisponível (%s); a usar o pytesseract.", e)
+            PyTessBaseAPI = None  # Não volta a tentar neste processo
+    return api
+
+def _ocr_imagem(imagem) -> str:
+    """
+    Lê UMA imagem (PIL). Usa o tesserocr se existir, senão o pytesseract.
+    """
+    api = _tess_api()
+    if api is not None:
+        api.SetImage(imagem)
+        return api.GetUTF8Text()
+    return pytesseract.image_to_string(imagem, lang="por", config=CONFIG_OCR)
 
-def clean_ocr_text(text: str) -> str:
+def aquecer_ocr():
     """
-    Corrige erros visuais do Tesseract.
-    Como é uma leitura por imagem, ele às vezes confunde formas parecidas.
+    Faz uma leitura 'de mentira' numa imagem minúscula, para que o custo de carregar
+    o Tesseract e o modelo de português não caia em cima do primeiro PDF.
+    Só vale a pena com o tesserocr, onde o motor fica carregado (nesta thread);
+    com o .exe seria só mais um processo do tesseract por worker, sem ganho.
     """
-    if not text: return ""
-    
-    # Corrige confusões comuns:
-    # '|' vira nada, '!' vira 1, 'l' (ele) vira 1
-    t = text.replace("|", "").replace("!", "1").replace("l", "1")
-    
-    # Corrige símbolos matemáticos colados
-    t = t.replace("$=", " ").replace("=", " = ")
-    return t
+    if not OCR_ATIVADO or _tess_api() is None:
+        return
+    try:
+        _ocr_imagem(Image.new("RGB", (32, 32), "white"))
+    except Exception as e:
+        logging.warning("Não foi possível aquecer o OCR: %s", e)
+
+def _preparar_imagem(imagem, limpar_ruido: bool = False):
+    """
+    Passa a página para preto e branco antes do OCR (limiar adaptativo).
+    O Tesseract recebe letras já 'limpas', lê mais depressa e erra menos.
+    'limpar_ruido' aplica ainda um filtro de ruído (lento), só usado na segunda tentativa.
+    Sem o OpenCV instalado, devolve a imagem como veio.
+    """
+    if cv2 is None:
+        return imagem
+    cinza = cv2.cvtColor(np.asarray(imagem.convert("RGB")), cv2.COLOR_RGB2GRAY)
+    if limpar_ruido:
+        cinza = cv2.fastNlMeansDenoising(cinza)
+    pb = cv2.adaptiveThreshold(cinza, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+    return Image.fromarray(pb)
+
 # ==========================================
 # LEITURA DO PDF
 # ==========================================
-def ler_conteudo_pdf(pdf_path: Path) -> Tuple[str, str]:
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            paginas_texto = []
-            for p in pdf.pages:
-                paginas_texto.append(p.extract_text() or "")
-            texto_digital = "\n".join(paginas_texto)
 
-            if len(texto_digital.strip()) > 50:
-                return texto_digital, "TEXTO_DIGITAL"
+# Biblioteca usada para tirar o texto digital: a versão em Rust se existir
+_pdf_texto = pdfplumber_rs or pdfplumber
+
+def _renderizar_primeira_pagina(pdf, pdf_path: Path, resolucao: int):
+    """
+    Transforma a 1ª página do PDF numa imagem (PIL) para o OCR.
+    Usa o PyMuPDF se estiver instalado. Senão usa o próprio pdfplumber; se o PDF
+    foi aberto com o pdfplumber-rs e este não souber desenhar a página,
+    abre o pdfplumber normal só para isso.
+    """
+    if fitz is not None:
+        # O 'with' fecha o ficheiro logo a seguir (importante com vários processos)
+        with fitz.open(pdf_path) as doc:
+            pix = doc[0].get_pixmap(dpi=resolucao)
+            return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    pagina = pdf.pages[0]
+    if hasattr(pagina, "to_image"):
+        return pagina.to_image(resolution=resolucao).original
+    with pdfplumber.open(pdf_path) as pdf_imagem:
+        return pdf_imagem.pages[0].to_image(resolution=resolucao).original
+
+def _texto_digital(pdf) -> Optional[str]:
+    """
+    Devolve o texto de um PDF digital, ou None se o PDF for imagem (precisa de OCR).
+    """
+    # Lê só as primeiras páginas para decidir se o PDF tem texto.
+    # Num PDF escaneado de 50 páginas isto evita 50 leituras inúteis.
+    paginas_texto = [p.extract_text() or "" for p in pdf.pages[:PAGINAS_AMOSTRA]]
+    if len("".join(paginas_texto).strip()) <= 50:
+        return None
+
+    # É digital: agora sim, lê o resto das páginas
+    for p in pdf.pages[PAGINAS_AMOSTRA:]:
+        paginas_texto.append(p.extract_text() or "")
+    return "\n".join(paginas_texto)
+
+def _abrir_pdf(pdf_path: Path):
+    """
+    Abre o PDF e tira o texto digital (ver _texto_digital). Devolve (pdf, texto), com o
+    PDF ainda aberto, para o OCR poder usá-lo; quem chama tem de o fechar.
+    O pdfplumber_rs ainda não lê tudo o que o pdfplumber lê: se falhar aqui, o mesmo
+    ficheiro é aberto de novo com o pdfplumber.
+    """
+    leitores = [_pdf_texto] if _pdf_texto is pdfplumber else [_pdf_texto, pdfplumber]
+    for leitor in leitores:
+        pdf = None
+        try:
+            pdf = leitor.open(pdf_path)
+            return pdf, _texto_digital(pdf)
+        except Exception as e:
+            if pdf is not None:
+                pdf.close()
+            if leitor is pdfplumber:
+                raise
+            logging.warning("pdfplumber_rs falhou em %s (%s); a usar o pdfplumber", pdf_path.name, e)
+
+def ler_conteudo_pdf(pdf_path: Path, imagem_destino: Optional[Path] = None,
+                     resolucao: int = RESOLUCAO_OCR, limpar_ruido: bool = False) -> Tuple[str, str]:
+    """
+    Lê o texto do PDF (digital ou por OCR).
+    Se 'imagem_destino' for passado e o PDF for imagem, NÃO corre o Tesseract aqui:
+    só grava a página nesse PNG e devolve (caminho_do_png, OCR_PENDENTE),
+    para o OCR ser feito depois numa única chamada (ver ocr_em_lote).
+    """
+    try:
+        pdf, texto = _abrir_pdf(pdf_path)
+        with pdf:
+            if texto is not None:
+                return texto, "TEXTO_DIGITAL"
 
             if not OCR_ATIVADO:
                 return "", "FALHA: É imagem e Tesseract não foi achado."
 
-            imagem = pdf.pages[0].to_image(resolution=300).original 
-            texto_lido = pytesseract.image_to_string(imagem, lang="por")
-            return texto_lido, "OCR (IA Visual)"
+            imagem = _preparar_imagem(_renderizar_primeira_pagina(pdf, pdf_path, resolucao), limpar_ruido)
+            # Com o tesserocr o OCR já é barato; o lote só compensa com o .exe
+            if imagem_destino is not None and _tess_api() is None:
+                imagem.save(imagem_destino)
+                return str(imagem_destino), OCR_PENDENTE
+
+            texto_lido = _ocr_imagem(imagem)
+            return texto_lido, METODO_OCR
             
     except Exception as e:
         return "", f"ERRO LEITURA: {str(e)}"
+
+def ocr_em_lote(imagens: List[Path]) -> List[str]:
+    """
+    Lê várias imagens com UMA só execução do Tesseract.
+    Abrir o tesseract.exe (e carregar o português) custa caro; em vez de o abrir
+    uma vez por imagem, escrevemos uma lista de imagens num .txt e passamos a lista.
+    O Tesseract separa o texto de cada imagem com uma quebra de página ('\x0c').
+    """
+    if not imagens:
+        return []
+
+    lista = imagens[0].parent / "images.txt"
+    try:
+        lista.write_text("".join(f"{p.resolve()}\n" for p in imagens), encoding="utf-8")
+        saida = pytesseract.image_to_string(str(lista), lang="por", config=CONFIG_OCR)
+        partes = saida.split("\x0c")
+        # Cada página termina com '\x0c', por isso sobra um pedaço vazio no fim
+        if partes and not partes[-1].strip():
+            partes.pop()
+        if len(partes) == len(imagens):
+            return partes
+        logging.warning("OCR em lote devolveu %d páginas para %d imagens; a ler uma a uma.", len(partes), len(imagens))
+    except Exception as e:
+        logging.warning("OCR em lote falhou (%s); a ler uma a uma.", e)
+
+    # Plano B: uma chamada por imagem (o comportamento antigo)
+    textos = []
+    for p in imagens:
+        try:
+            textos.append(pytesseract.image_to_string(str(p), lang="por", config=CONFIG_OCR))
+        except Exception as e:
+            logging.warning("OCR falhou em %s: %s", p, e)
+            textos.append("")
+    return textos
 # ==========================================
-# EXTRAÇÃO DE VALORES (MODO SENSÍVEL)
+# CACHE DOS RESULTADOS (NÃO LER DUAS VEZES O MESMO PDF)
 # ==========================================
-def extrair_valor(text: str) -> Tuple[float, str]:
-    # 1. LIMPEZA INICIAL
-    # Remove sujeira do OCR (ex: troca '!' por '1')
-    text_clean = clean_ocr_text(text)
-    
-    # Transforma tudo em MAIÚSCULAS. Assim, tanto faz se está escrito "Nota" ou "NOTA".
-    text_upper = text_clean.upper()#transforma tudo em maiúsculas
-    
-    # 2. O GATILHO DO "MODO SENSÍVEL" (A grande mudança)
-    # O robô verifica se o texto tem palavras de documentos oficiais importantes.
-    # Se encontrar qualquer uma destas, ele muda o comportamento para ser mais preciso.
-    eh_documento_oficial = "NOTA DE DÉBITO" in text_upper or "PENALIDADE" in text_upper or "NOTA FISCAL" in text_upper
-
-    # 3. A REDE DE PESCA (REGEX)
-    # Esta linha procura TODOS os padrões numéricos que parecem dinheiro brasileiro.
-    # Ex: pega "1.000,00", pega "37,88", pega "2025,00".
-    todos_valores = re.findall(r"(\d{1,3}(?:\.\d{3})*,\d{2})", text_clean)
-    
-    lista_floats = []#lista de valores em formato float
-    
-    # 4. A FILTRAGEM INTELIGENTE
-    if todos_valores:
-        for v in todos_valores:
-            # Traduz o texto para número de computador (troca vírgula por ponto)
-            f = br_money_to_float(v)
-            
-            # --- FILTRO A: BLOQUEIO DE DATAS ---
-            # Se o número for exatamente um ano atual ou próximo, IGNORA.
-            # Isso impede que a data "25/12/2025" seja lida como R$ 2.025,00.
-            if f in [2024.0, 2025.0, 2026.0, 2027.0]:
-                continue
-            
-            # --- FILTRO B: A LÓGICA DE GARANHUNS ---
-            if eh_documento_oficial:
-                # Se sabemos que é uma Nota/Penalidade (Modo Sensível), confiamos no documento.
-                # Aceitamos qualquer valor maior que ZERO (resolve o caso dos R$ 37,88).
-                if f > 0: lista_floats.append(f)
+def chave_cache(arquivo: Path) -> str:
+    """
+    Gera a 'impressão digital' do ficheiro: SHA-256 do conteúdo + tamanho + data de modificação.
+    Em PDFs grandes só lemos o início e o fim (BLOCO_HASH de cada lado), que já chega
+    para distinguir faturas e poupa muito disco/rede.
+    """
+    info = arquivo.stat()
+    h = hashlib.sha256()
+    with open(arquivo, "rb") as f:
+        if info.st_size <= 2 * BLOCO_HASH:
+            h.update(f.read())
+        else:
+            h.update(f.read(BLOCO_HASH))
+            f.seek(-BLOCO_HASH, os.SEEK_END)
+            h.update(f.read(BLOCO_HASH))
+    return f"{h.hexdigest()}:{info.st_size}:{info.st_mtime_ns}"
+
+def versao_cache() -> str:
+    """
+    Tudo o que muda o resultado da leitura de um PDF: regras de extração, opções do OCR
+    e bibliotecas opcionais em uso. Se algo disto mudar, o cache antigo deixa de valer.
+    """
+    return "|".join(str(x) for x in (
+        VERSAO_REGRAS, CONFIG_OCR, RESOLUCAO_OCR, RESOLUCAO_OCR_REFORCO, PAGINAS_AMOSTRA,
+        PyTessBaseAPI is not None, pdfplumber_rs is not None, fitz is not None, cv2 is not None,
+    ))
+
+class OcrCache:
+    """
+    Guarda em disco (JSON) o resultado de cada PDF já lido.
+    Na próxima vez que o mesmo ficheiro aparecer, o valor vem daqui
+    sem passar pelo pdfplumber nem pelo Tesseract.
+    O ficheiro leva a versão (ver versao_cache); se não bater certo, começa vazio.
+    Cada registo guarda também o dia em que foi usado pela última vez (ver podar).
+    """
+    _path = Path.home() / ".concilia_pdf_cache.json"
+    _validade_dias = 180  # Registos sem uso há mais tempo do que isto são apagados
+
+    def __init__(self):
+        self._versao = versao_cache()
+        self._dados = {}
+        self._hoje = int(time.time() // 86400)  # Dias desde 1970; chega para medir idade
+        self._alterado = False
+        try:
+            conteudo = json.loads(self._path.read_text(encoding="utf-8"))
+            if isinstance(conteudo, dict) and conteudo.get("versao") == self._versao:
+                self._dados = conteudo.get("itens", {})
+                for registo in self._dados.values():
+                    if len(registo) < 4:  # Registo sem data de uso: conta como de hoje
+                        registo.append(self._hoje)
             else:
-                # Se NÃO sabemos o que é o documento, somos desconfiados.
-                # Só aceitamos valores acima de 50 para não pegar número de página ou lixo.
-                if f > 50: lista_floats.append(f)
-
-    # 5. A DECISÃO FINAL
-    if lista_floats:
-        # Se sobraram números válidos, pega o MAIOR de todos.
-        # Em 99% das faturas, o maior valor presente na folha é o "Total a Pagar".
-        maior_valor = max(lista_floats)
-        
-        # Define a mensagem de status baseada no modo usado
-        msg = "Maior Valor (Modo Sensível)" if eh_documento_oficial else "Maior Valor (>50)"
-        return maior_valor, msg
+                logging.info("Cache de outra versão; os PDFs serão lidos de novo.")
+                self._alterado = True  # Grava já no formato/versão atual
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            # Cache estragado não é motivo para parar: começa do zero
+            logging.warning("Cache ignorado (%s): %s", self._path, e)
+
+    def get(self, chave: str) -> Optional[Tuple[float, str, str]]:
+        registo = self._dados.get(chave)
+        if not registo:
+            return None
+        if registo[3:] != [self._hoje]:
+            # Marca como usado hoje (só uma vez por dia, para não regravar o cache à toa)
+            self._dados[chave] = registo[:3] + [self._hoje]
+            self._alterado = True
+        return tuple(registo[:3])
+
+    def put(self, chave: str, amount: float, status: str, method: str):
+        self._dados[chave] = [amount, status, method, self._hoje]
+        self._alterado = True
+
+    def podar(self):
+        """
+        Apaga os registos que não são usados há mais de _validade_dias (ex: PDFs apagados
+        ou alterados), para o cache não crescer para sempre.
+        Um registo parado não faz mal (a chave já inclui tamanho e data), por isso as pastas
+        de outras execuções continuam no cache e voltam a sair dele na hora.
+        """
+        limite = self._hoje - self._validade_dias
+        antigos = [chave for chave, registo in self._dados.items() if registo[3] < limite]
+        for chave in antigos:
+            del self._dados[chave]
+        if antigos:
+            self._alterado = True
+
+    def save(self):
+        if not self._alterado:
+            return
+        try:
+            # Escreve num ficheiro temporário e troca, para nunca deixar um JSON pela metade
+            tmp = self._path.with_suffix(".tmp")
+            conteudo = {"versao": self._versao, "itens": self._dados}
+            tmp.write_text(json.dumps(conteudo, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self._path)
+            self._alterado = False
+        except OSError as e:
+            logging.warning("Não foi possível gravar o cache (%s): %s", self._path, e)
 
-    # Se não achou nada ou tudo foi filtrado, retorna zero.
-    return 0.0, "Valor não identificado"
+# ==========================================
+# PROCESSAMENTO EM PARALELO (UM PROCESSO POR NÚCLEO)
+# ==========================================
+def _init_worker():
+    """
+    Corre uma vez em cada processo (ou thread) do pool, antes de qualquer ficheiro.
+    Como o pool é criado ao abrir a janela (ver iniciar_pool), isto acontece enquanto
+    o utilizador ainda escolhe as pastas.
+    O limite de threads do OpenMP já vem do topo do ficheiro (herdado por cada processo).
+    """
+    aquecer_ocr()
+
+def _montar_item(arquivo: Path, categoria: str, texto: str, metodo_leitura: str) -> PdfItem:
+    """
+    Transforma o texto lido de UM ficheiro na ficha final.
+    """
+    try:
+        if metodo_leitura.startswith(("ERRO", "FALHA")):
+            return PdfItem(arquivo.name, str(arquivo), categoria, 0.0, "ERRO", metodo_leitura)
+
+        valor, metodo_valor = extrair_valor(texto)
+        if valor == 0 and metodo_leitura == METODO_OCR:
+            # A 200 DPI não se achou valor: tenta de novo com mais detalhe
+            # (e, se o OCR não leu nada, limpando também o ruído da imagem)
+            texto, metodo_leitura = ler_conteudo_pdf(arquivo, resolucao=RESOLUCAO_OCR_REFORCO,
+                                                     limpar_ruido=not texto.strip())
+            if metodo_leitura.startswith(("ERRO", "FALHA")):
+                return PdfItem(arquivo.name, str(arquivo), categoria, 0.0, "ERRO", metodo_leitura)
+            metodo_leitura = f"{metodo_leitura} {RESOLUCAO_OCR_REFORCO} DPI"
+            valor, metodo_valor = extrair_valor(texto)
+
+        status = "OK" if valor > 0 else "REVISAR"
+        return PdfItem(arquivo.name, str(arquivo), categoria, valor, status, f"{metodo_leitura} -> {metodo_valor}")
+    except Exception as e:
+        # Um ficheiro com problema não pode derrubar o lote inteiro
+        logging.exception("Falha ao processar %s", arquivo)
+        return PdfItem(arquivo.name, str(arquivo), categoria, 0.0, "ERRO", f"ERRO PROCESSAMENTO: {e}")
+
+def _processar_lote(arquivos: List[Path], categoria: str) -> List[PdfItem]:
+    """
+    Lê um lote de ficheiros dentro de UM processo do pool.
+    1º passa o texto digital em todos; os que são imagem ficam gravados em PNG.
+    2º faz o OCR de todas essas imagens numa só chamada ao Tesseract.
+    Fica ao nível do módulo para poder ser enviada aos outros processos (pickle).
+    """
+    lidos = []
+    pendentes = []  # posições (em 'lidos') que esperam pelo OCR
+    with tempfile.TemporaryDirectory(prefix="concilia_ocr_") as tmp:
+        for idx, arquivo in enumerate(arquivos):
+            texto, metodo = ler_conteudo_pdf(arquivo, Path(tmp) / f"{idx}.png")
+            if metodo == OCR_PENDENTE:
+                pendentes.append(idx)
+            lidos.append((texto, metodo))
+
+        textos_ocr = ocr_em_lote([Path(lidos[idx][0]) for idx in pendentes])
+        for idx, texto in zip(pendentes, textos_ocr):
+            lidos[idx] = (texto, METODO_OCR)
+
+    return [_montar_item(a, categoria, texto, metodo) for a, (texto, metodo) in zip(arquivos, lidos)]
+
+def _num_workers() -> int:
+    """Quantos processos (ou threads, ver _criar_executor) trabalham ao mesmo tempo."""
+    if getattr(sys, "frozen", False):
+        return min(8, (os.cpu_count() or 1) * 2)
+    return os.cpu_count() or 1
+
+def _criar_executor() -> Executor:
+    """
+    Escolhe como ler vários ficheiros ao mesmo tempo.
+    Normalmente: um processo por núcleo. Num executável 'congelado' (PyInstaller/py2exe)
+    abrir novos processos nem sempre funciona, por isso usamos threads; como o trabalho
+    pesado é feito pelo Tesseract (fora do GIL), as threads também rendem.
+    """
+    if getattr(sys, "frozen", False):
+        return ThreadPoolExecutor(max_workers=_num_workers(), initializer=_init_worker)
+    return ProcessPoolExecutor(max_workers=_num_workers(), initializer=_init_worker)
+
+def iniciar_pool() -> Executor:
+    """
+    Cria o pool que a janela usa em todas as execuções e põe já os workers a arrancar.
+    O pool só abre um worker quando recebe uma tarefa; por isso mandamos uma tarefa
+    vazia por worker. Assim, o custo de abrir os processos (no Windows, importar tudo
+    de novo) e de aquecer o OCR fica pago antes do primeiro clique, e uma só vez.
+    """
+    ex = _criar_executor()
+    for _ in range(_num_workers()):
+        ex.submit(os.getpid)  # Tarefa vazia (tem de ir por pickle, daí uma função do sistema)
+    return ex
+
+def _tamanho_lote(n_arquivos: int) -> int:
+    """
+    Quantos ficheiros vão em cada tarefa do pool.
+    O lote existe só para juntar várias imagens numa execução do tesseract.exe;
+    mas nunca pode ser tão grande que deixe núcleos parados (ex: 23 ficheiros em
+    8 núcleos dão lotes de 3, e não 3 lotes de 10). Com o tesserocr o OCR é feito
+    na hora, por isso cada ficheiro vai sozinho.
+    """
+    if PyTessBaseAPI is not None:
+        return 1
+    return max(1, min(TAMANHO_LOTE, math.ceil(n_arquivos / _num_workers())))
+
+def processar_lista(grupos: List[Tuple[List[Path], str]], executor: Executor,
+                    progresso: Optional[Callable[[int, int], None]] = None,
+                    cache: Optional[OcrCache] = None) -> List[PdfItem]:
+    """
+    Processa os PDFs de todas as categorias, ex: [(receitas, "Receita"), (despesas, "Despesa")],
+    no mesmo pool: os lotes de uma categoria e da outra correm ao mesmo tempo.
+    Os ficheiros que já estão no 'cache' (mesmo conteúdo) nem chegam a ser abertos.
+    O 'progresso' (opcional) recebe (lidos, total) a cada lote terminado, na thread
+    que chamou esta função.
+    """
+    arquivos: List[Path] = []
+    categorias: List[str] = []
+    for lista, categoria in grupos:
+        arquivos.extend(lista)
+        categorias.extend([categoria] * len(lista))
+    if not arquivos:
+        return []
+
+    itens: List[Optional[PdfItem]] = [None] * len(arquivos)
+    chaves: List[Optional[str]] = [None] * len(arquivos)
+    faltam = []  # posições que precisam mesmo de ser lidas
+
+    for idx, arquivo in enumerate(arquivos):
+        guardado = None
+        if cache is not None:
+            try:
+                chaves[idx] = chave_cache(arquivo)
+                guardado = cache.get(chaves[idx])
+            except OSError as e:
+                logging.warning("Não foi possível calcular o hash de %s: %s", arquivo, e)
+        if guardado:
+            valor, status, metodo = guardado
+            itens[idx] = PdfItem(arquivo.name, str(arquivo), categorias[idx], valor, status, metodo)
+        else:
+            faltam.append(idx)
+
+    feitos = len(arquivos) - len(faltam)
+    if feitos:
+        logging.info("%d/%d arquivos vieram do cache", feitos, len(arquivos))
+        if progresso:
+            progresso(feitos, len(arquivos))
+
+    # Cada lote leva ficheiros de uma só categoria (o _processar_lote recebe uma)
+    tamanho = _tamanho_lote(len(faltam))
+    lotes = []
+    for categoria in dict.fromkeys(categorias):
+        da_categoria = [idx for idx in faltam if categorias[idx] == categoria]
+        lotes.extend(da_categoria[i:i + tamanho] for i in range(0, len(da_categoria), tamanho))
+
+    futures = {executor.submit(_processar_lote, [arquivos[idx] for idx in lote], categorias[lote[0]]): lote
+               for lote in lotes}
+    for f in as_completed(futures):
+        lote = futures[f]
+        try:
+            resultado = f.result()
+        except Exception as e:
+            # Ex: um processo do pool morreu. Só este lote fica com ERRO; o resto segue.
+            logging.exception("Falha num lote de %s", categorias[lote[0]])
+            resultado = [PdfItem(arquivos[idx].name, str(arquivos[idx]), categorias[idx], 0.0, "ERRO",
+                                 f"ERRO PROCESSAMENTO: {e}") for idx in lote]
+        for idx, item in zip(lote, resultado):
+            itens[idx] = item
+            # Erros podem ser passageiros (ex: Tesseract fora do ar); não ficam guardados
+            if cache is not None and chaves[idx] and item.status != "ERRO":
+                cache.put(chaves[idx], item.amount, item.status, item.method)
+        feitos += len(lote)
+        logging.info("%d/%d arquivos lidos", feitos, len(arquivos))
+        if progresso:
+            progresso(feitos, len(arquivos))
+
+    # Devolve na mesma ordem das pastas, para o Excel não ficar baralhado
+    return itens
 
 # ==========================================
 # GERADOR DE EXCEL (ALTERADO)
 # ==========================================
-def salvar_excel(caminho: Path, itens: List[PdfItem]):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Relatorio"
-    
-    # Cabeçalho
-    cabecalho = ["Arquivo", "Categoria", "Valor", "Status", "Método", "Caminho"]
-    ws.append(cabecalho)
-    
+# Estilos criados UMA vez e partilhados por todas as células que os usam
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+HEADER_FILL = PatternFill("solid", fgColor="003366")
+FONTE_RECEITA = Font(bold=True, color="006600")  # Verde
+FONTE_DESPESA = Font(bold=True, color="CC0000")  # Vermelho
+FONTE_SALDO = Font(bold=True, size=12)
+
+def calcular_totais(itens: List[PdfItem]) -> Tuple[float, float, int]:
+    """
+    Soma receitas e despesas e conta as pendências, numa só passagem pela lista.
+    Devolve (total_receita, total_despesa, pendencias).
+    """
     total_receita = 0.0
     total_despesa = 0.0
-    
-    # Preenche dados e calcula totais
+    pendencias = 0
     for i in itens:
-        ws.append([
-            i.file_name, i.category, f"R$ {format_br(i.amount)}",
-            i.status, i.method, i.file_path
-        ])
-        
         # Só soma se o status for OK para garantir precisão
         if i.status == "OK":
             if i.category == "Receita":
                 total_receita += i.amount
             elif i.category == "Despesa":
                 total_despesa += i.amount
+        else:
+            pendencias += 1
+    return total_receita, total_despesa, pendencias
+
+def salvar_excel(caminho: Path, itens: List[PdfItem], total_receita: float, total_despesa: float):
+    # Modo 'write_only': as linhas vão direto para o disco em vez de ficarem
+    # todas na memória. Em troca, não dá para voltar atrás e mexer em células,
+    # por isso os totais (ver calcular_totais) e os estilos têm de vir prontos.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Relatorio")
+
+    # Ajuste de larguras (tem de vir antes da primeira linha)
+    ws.column_dimensions["A"].width = 50
+    ws.column_dimensions["C"].width = 20
+    ws.column_dimensions["E"].width = 40
+
+    def celula(valor, font=None, fill=None):
+        c = WriteOnlyCell(ws, value=valor)
+        if font: c.font = font
+        if fill: c.fill = fill
+        return c
+
+    saldo = total_receita - total_despesa
+
+    # Cabeçalho
+    cabecalho = ["Arquivo", "Categoria", "Valor", "Status", "Método", "Caminho"]
+    ws.append([celula(h, HEADER_FONT, HEADER_FILL) for h in cabecalho])
     
-    # Formatação do Cabeçalho
-    for cell in ws[1]:
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill("solid", fgColor="003366")
+    # Preenche dados
+    for i in itens:
+        ws.append([
+            i.file_name, i.category, f"R$ {format_br(i.amount)}",
+            i.status, i.method, i.file_path
+        ])
     
-    # --- ÁREA DE TOTAIS (NOVO) ---
+    # --- ÁREA DE TOTAIS ---
     ws.append([]) # Linha em branco
     ws.append([]) # Linha em branco
     
-    linha_inicio = ws.max_row + 1
-    
-    # Adiciona os totais
     ws.append(["RESUMO FINANCEIRO", "", "", "", "", ""])
-    ws.append(["(+) TOTAL RECEITAS", "", f"R$ {format_br(total_receita)}", "", "", ""])
-    ws.append(["(-) TOTAL DESPESAS", "", f"R$ {format_br(total_despesa)}", "", "", ""])
-    
-    saldo = total_receita - total_despesa
-    ws.append(["(=) SALDO FINAL", "", f"R$ {format_br(saldo)}", "", "", ""])
-    
-    # Formatação dos Totais
-    # Estilo Receita (Verde)
-    cell_rec_lbl = ws.cell(row=linha_inicio+1, column=1)
-    cell_rec_val = ws.cell(row=linha_inicio+1, column=3)
-    cell_rec_lbl.font = Font(bold=True, color="006600")
-    cell_rec_val.font = Font(bold=True, color="006600")
-
-    # Estilo Despesa (Vermelho)
-    cell_desp_lbl = ws.cell(row=linha_inicio+2, column=1)
-    cell_desp_val = ws.cell(row=linha_inicio+2, column=3)
-    cell_desp_lbl.font = Font(bold=True, color="CC0000")
-    cell_desp_val.font = Font(bold=True, color="CC0000")
-
-    # Estilo Saldo (Azul ou Preto)
-    cell_saldo_lbl = ws.cell(row=linha_inicio+3, column=1)
-    cell_saldo_val = ws.cell(row=linha_inicio+3, column=3)
-    cell_saldo_lbl.font = Font(bold=True, size=12)
-    cell_saldo_val.font = Font(bold=True, size=12)
-    
-    # Ajuste de larguras
-    ws.column_dimensions["A"].width = 50
-    ws.column_dimensions["C"].width = 20
-    ws.column_dimensions["E"].width = 40
+    ws.append([celula("(+) TOTAL RECEITAS", FONTE_RECEITA), "", celula(f"R$ {format_br(total_receita)}", FONTE_RECEITA), "", "", ""])
+    ws.append([celula("(-) TOTAL DESPESAS", FONTE_DESPESA), "", celula(f"R$ {format_br(total_despesa)}", FONTE_DESPESA), "", "", ""])
+    ws.append([celula("(=) SALDO FINAL", FONTE_SALDO), "", celula(f"R$ {format_br(saldo)}", FONTE_SALDO), "", "", ""])
     
     wb.save(caminho)
 
@@ -273,6 +704,13 @@ class App(tk.Tk):
         self.geometry("650x500")
         self.path_rec = None
         self.path_desp = None
+        self.files_rec = []   # PDFs encontrados na seleção (evita varrer a pasta de novo)
+        self.files_desp = []
+        self.cache = OcrCache()
+        self.rodando = False  # Há uma leitura em curso (ver run)
+        self.fila = None      # Recados da thread de trabalho para a janela
+        self.executor = iniciar_pool()  # Um só pool para a sessão toda
+        self.protocol("WM_DELETE_WINDOW", self.fechar)
 
         tk.Label(self, text="Conciliador Final (Totais e Saldo)", font=("Arial", 14, "bold"), fg="#333").pack(pady=15)
         
@@ -296,8 +734,10 @@ class App(tk.Tk):
         self.lbl_desp = tk.Label(frame, text="Nenhuma pasta selecionada")
         self.lbl_desp.grid(row=1, column=1, sticky="w")
 
-        btn_run = tk.Button(self, text="PROCESSAR E CALCULAR", font=("Arial", 12, "bold"), bg="#008CBA", fg="white", width=30, height=2, command=self.run)
-        btn_run.pack(pady=20)
+        tk.Button(frame, text="🔄 Reler pastas", command=self.atualizar_pastas).grid(row=2, column=0, padx=5, pady=5)
+
+        self.btn_run = tk.Button(self, text="PROCESSAR E CALCULAR", font=("Arial", 12, "bold"), bg="#008CBA", fg="white", width=30, height=2, command=self.run)
+        self.btn_run.pack(pady=20)
 
         self.status = tk.Label(self, text="Aguardando...", fg="blue")
         self.status.pack()
@@ -306,15 +746,48 @@ class App(tk.Tk):
         p = filedialog.askdirectory()
         if p: 
             self.path_rec = Path(p)
-            qtd = len(list(self.path_rec.rglob("*.pdf")))
-            self.lbl_rec.config(text=f"{qtd} arquivos encontrados", fg="green")
+            self.files_rec = list(self.path_rec.rglob("*.pdf"))
+            self.lbl_rec.config(text=f"{len(self.files_rec)} arquivos encontrados", fg="green")
 
     def sel_desp(self):
         p = filedialog.askdirectory()
         if p: 
             self.path_desp = Path(p)
-            qtd = len(list(self.path_desp.rglob("*.pdf")))
-            self.lbl_desp.config(text=f"{qtd} arquivos encontrados", fg="green")
+            self.files_desp = list(self.path_desp.rglob("*.pdf"))
+            self.lbl_desp.config(text=f"{len(self.files_desp)} arquivos encontrados", fg="green")
+
+    def atualizar_pastas(self):
+        """Volta a varrer as pastas já escolhidas (se entraram PDFs novos entretanto)."""
+        if self.path_rec:
+            self.files_rec = list(self.path_rec.rglob("*.pdf"))
+            self.lbl_rec.config(text=f"{len(self.files_rec)} arquivos encontrados", fg="green")
+        if self.path_desp:
+            self.files_desp = list(self.path_desp.rglob("*.pdf"))
+            self.lbl_desp.config(text=f"{len(self.files_desp)} arquivos encontrados", fg="green")
+
+    def fechar(self):
+        if self.rodando:
+            if not messagebox.askyesno("Sair", "A leitura ainda não terminou. Sair mesmo assim?"):
+                return
+        else:
+            # Durante a leitura o cache é da thread de trabalho; ela grava-o no fim
+            self.cache.save()
+        # Lotes ainda na fila são descartados; não espera pelos que já estão a correr
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
+    def _pool(self) -> Executor:
+        """
+        Devolve o pool da sessão. Se um worker morreu numa execução anterior,
+        o pool fica inutilizável; nesse caso cria um novo.
+        """
+        try:
+            self.executor.submit(os.getpid)
+        except BrokenExecutor:
+            logging.warning("O pool de leitura parou; a criar um novo.")
+            self.executor.shutdown(wait=False)
+            self.executor = iniciar_pool()
+        return self.executor
 
     def run(self):
         if not self.path_rec and not self.path_desp:
@@ -323,23 +796,54 @@ class App(tk.Tk):
         destino = filedialog.askdirectory(title="Onde salvar o Relatório Final?")
         if not destino: return
 
+        # Bloqueia o botão até a mensagem final: um segundo clique abriria outra execução por cima
+        self.rodando = True
+        self.btn_run.config(state="disabled")
         self.status.config(text="Lendo arquivos... (OCR pode demorar)")
-        self.update()
-
-        arquivos_rec = list(self.path_rec.rglob("*.pdf")) if self.path_rec else []
-        arquivos_desp = list(self.path_desp.rglob("*.pdf")) if self.path_desp else []
-
-        itens = processar_lista(arquivos_rec, "Receita") + processar_lista(arquivos_desp, "Despesa")
-
-        timestamp = datetime.now().strftime("%H%M%S")
-        caminho_excel = Path(destino) / f"Relatorio_Final_{timestamp}.xlsx"
-        salvar_excel(caminho_excel, itens)
 
-        tot_rec = sum(i.amount for i in itens if i.category == "Receita" and i.status == "OK")
-        tot_desp = sum(i.amount for i in itens if i.category == "Despesa" and i.status == "OK")
+        # A leitura corre noutra thread, para a janela continuar a responder (e a
+        # mostrar o progresso). A thread não toca na janela: manda recados pela fila.
+        self.fila = queue.Queue()
+        grupos = [(self.files_rec or [], "Receita"), (self.files_desp or [], "Despesa")]
+        threading.Thread(target=self._processar, args=(grupos, Path(destino), self._pool()), daemon=True).start()
+        self.after(100, self._acompanhar)
+
+    def _processar(self, grupos: List[Tuple[List[Path], str]], destino: Path, executor: Executor):
+        """Corre na thread de trabalho: lê tudo, grava o Excel e avisa pela fila."""
+        try:
+            itens = processar_lista(grupos, executor, lambda feitos, total: self.fila.put(("progresso", feitos, total)),
+                                    self.cache)
+            self.cache.podar()
+            self.cache.save()
+
+            timestamp = datetime.now().strftime("%H%M%S")
+            caminho_excel = destino / f"Relatorio_Final_{timestamp}.xlsx"
+            tot_rec, tot_desp, pendencias = calcular_totais(itens)
+            salvar_excel(caminho_excel, itens, tot_rec, tot_desp)
+            self.fila.put(("fim", tot_rec, tot_desp, pendencias))
+        except Exception as e:
+            logging.exception("Falha no processamento")
+            self.fila.put(("erro", str(e)))
+
+    def _acompanhar(self):
+        """Corre na thread da janela (via after): mostra os recados da thread de trabalho."""
+        try:
+            while True:
+                recado = self.fila.get_nowait()
+                if recado[0] == "progresso":
+                    self.status.config(text=f"{recado[1]}/{recado[2]} arquivos lidos...")
+                elif recado[0] == "erro":
+                    self.status.config(text="Processo interrompido.")
+                    messagebox.showerror("Erro", f"Não foi possível terminar:\n{recado[1]}")
+                    return self._liberar()
+                else:
+                    self._mostrar_resultado(*recado[1:])
+                    return self._liberar()
+        except queue.Empty:
+            self.after(100, self._acompanhar)
+
+    def _mostrar_resultado(self, tot_rec: float, tot_desp: float, pendencias: int):
         saldo = tot_rec - tot_desp
-        pendencias = sum(1 for i in itens if i.status != "OK")
-
         msg = (f"Cálculo Finalizado!\n\n"
                f"(+) Receitas: {format_br(tot_rec)}\n"
                f"(-) Despesas: {format_br(tot_desp)}\n"
@@ -347,8 +851,13 @@ class App(tk.Tk):
                f"Pendências: {pendencias}\n"
                f"Abra o Excel para ver o detalhe.")
         
-        messagebox.showinfo("Sucesso", msg)
         self.status.config(text="Processo finalizado.")
+        messagebox.showinfo("Sucesso", msg)
+
+    def _liberar(self):
+        """Só depois da mensagem final o botão volta a aceitar cliques."""
+        self.rodando = False
+        self.btn_run.config(state="normal")
 
 if __name__ == "__main__":
     App().mainloop()
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Funções de dinheiro: ler valores no formato brasileiro e achar o total de um documento.
+
+Ficam separadas do main.py para poderem ser compiladas com o Cython (ver setup.py).
+Se existir o moeda.*.pyd / moeda.*.so compilado, o Python usa-o automaticamente;
+se não existir, usa este ficheiro normal, com o mesmo resultado.
+"""
+import re
+from typing import Tuple
+
+# Versão das regras de extração. AUMENTE este número sempre que mudar o
+# extrair_valor (ou as funções que ele usa): invalida o cache de resultados do main.py.
+VERSAO_REGRAS = 1
+
+# ==========================================
+# FUNÇÕES MATEMÁTICAS E DE LIMPEZA
+# ==========================================
+
+# Expressões regulares compiladas uma só vez (são usadas em todos os PDFs)
+_RE_MONEY = re.compile(r"(\d{1,3}(?:\.\d{3})*,\d{2})")  # Valores no formato 1.000,00
+
+class _SoNumeros(dict):
+    """
+    Tabela para o str.translate que apaga tudo o que não for número, vírgula ou ponto.
+    Os caracteres comuns (0-255) já vêm calculados; qualquer outro (ex: '€') cai no
+    __missing__ e também é apagado.
+    """
+    def __missing__(self, codigo):
+        return None
+
+_KEEP = frozenset("0123456789,.")
+_TRANS = _SoNumeros(str.maketrans("", "", "".join(chr(c) for c in range(256) if chr(c) not in _KEEP)))
+_TRANS.update((ord(c), c) for c in _KEEP)
+
+def br_money_to_float(raw: str) -> float:
+    """
+    Traduz o formato brasileiro (1.000,00) para formato de computador (1000.00).
+    Sem isto, não conseguimos somar os valores.
+    """
+    if not raw: return 0.0
+    
+    # Remove tudo o que não for número, vírgula ou ponto (tira letras, R$, espaços)
+    # e troca a pontuação:
+    # 1. Remove o ponto de milhar (1.000 vira 1000)
+    # 2. Troca a vírgula decimal por ponto (50,90 vira 50.90)
+    clean = str(raw).translate(_TRANS).replace(".", "").replace(",", ".")
+    if not clean: return 0.0
+    
+    try:
+        return float(clean) # Converte texto para número real
+    except ValueError:
+        return 0.0
+
+def format_br(value: float) -> str:
+    """
+    Faz o oposto da função anterior.
+    Pega no número de cálculo e deixa bonito para o Excel (R$ 1.200,50).
+    """
+    # Usa um truque com 'X' para trocar ponto por vírgula sem baralhar os dois
+    return f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def clean_ocr_text(text: str) -> str:
+    """
+    Corrige erros visuais do Tesseract.
+    Como é uma leitura por imagem, ele às vezes confunde formas parecidas.
+    """
+    if not text: return ""
+    
+    # Corrige confusões comuns:
+    # '|' vira nada, '!' vira 1, 'l' (ele) vira 1
+    t = text.replace("|", "").replace("!", "1").replace("l", "1")
+    
+    # Corrige símbolos matemáticos colados
+    t = t.replace("$=", " ").replace("=", " = ")
+    return t
+
+# ==========================================
+# EXTRAÇÃO DE VALORES (MODO SENSÍVEL)
+# ==========================================
+def extrair_valor(text: str) -> Tuple[float, str]:
+    # 1. LIMPEZA INICIAL
+    # Remove sujeira do OCR (ex: troca '!' por '1')
+    text_clean = clean_ocr_text(text)
+    
+    # Transforma tudo em MAIÚSCULAS. Assim, tanto faz se está escrito "Nota" ou "NOTA".
+    text_upper = text_clean.upper()#transforma tudo em maiúsculas
+    
+    # 2. O GATILHO DO "MODO SENSÍVEL" (A grande mudança)
+    # O robô verifica se o texto tem palavras de documentos oficiais importantes.
+    # Se encontrar qualquer uma destas, ele muda o comportamento para ser mais preciso.
+    eh_documento_oficial = "NOTA DE DÉBITO" in text_upper or "PENALIDADE" in text_upper or "NOTA FISCAL" in text_upper
+
+    # 3. A REDE DE PESCA (REGEX)
+    # Procura, um a um, TODOS os padrões numéricos que parecem dinheiro brasileiro.
+    # Ex: pega "1.000,00", pega "37,88", pega "2025,00".
+    # Vamos guardando só o MAIOR aceite até agora (sem montar uma lista).
+    maior_valor = 0.0
+
+    # --- FILTRO B: A LÓGICA DE GARANHUNS ---
+    # Se sabemos que é uma Nota/Penalidade (Modo Sensível), confiamos no documento:
+    # aceitamos qualquer valor maior que ZERO (resolve o caso dos R$ 37,88).
+    # Se NÃO sabemos o que é o documento, somos desconfiados: só acima de 50,
+    # para não pegar número de página ou lixo.
+    minimo = 0.0 if eh_documento_oficial else 50.0
+
+    # 4. A FILTRAGEM INTELIGENTE
+    for m in _RE_MONEY.finditer(text_clean):
+        # Traduz o texto para número de computador (troca vírgula por ponto)
+        f: float = br_money_to_float(m.group(1))
+        
+        # --- FILTRO A: BLOQUEIO DE DATAS ---
+        # Se o número for exatamente um ano atual ou próximo, IGNORA.
+        # Isso impede que a data "25/12/2025" seja lida como R$ 2.025,00.
+        if f in (2024.0, 2025.0, 2026.0, 2027.0):
+            continue
+        
+        if f > minimo and f > maior_valor:
+            maior_valor = f
+
+    # 5. A DECISÃO FINAL
+    if maior_valor:
+        # Se sobrou algum número válido, fica o MAIOR de todos.
+        # Em 99% das faturas, o maior valor presente na folha é o "Total a Pagar".
+        # Define a mensagem de status baseada no modo usado
+        msg = "Maior Valor (Modo Sensível)" if eh_documento_oficial else "Maior Valor (>50)"
+        return maior_valor, msg
+
+    # Se não achou nada ou tudo foi filtrado, retorna zero.
+    return 0.0, "Valor não identificado"
@@ -0,0 +1,18 @@
+"""
+Compila o moeda.py com o Cython (opcional; deixa a extração de valores mais rápida).
+
+    pip install cython
+    python setup.py build_ext --inplace
+
+Isto gera um moeda.*.pyd (Windows) ou moeda.*.so ao lado do moeda.py, que o Python
+passa a usar no lugar do ficheiro .py. Sem ele, o programa funciona na mesma.
+Sempre que mudar o moeda.py, corra este comando outra vez: se o compilado ficar mais
+antigo que o moeda.py, o main.py ignora-o (e avisa no log).
+"""
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="concilia-pdf-moeda",
+    ext_modules=cythonize("moeda.py", compiler_directives={"language_level": 3}),
+)